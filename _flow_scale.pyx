@@ -0,0 +1,199 @@
+# cython: language_level=3, boundscheck=False, wraparound=False, cdivision=True
+# Optional compiled chunk processor for flow-scale.py.
+#
+# Build in place with `cythonize -i _flow_scale.pyx`; flow-scale.py uses the
+# pure-Python code path when this module is not available. The results must
+# stay byte-for-byte identical to that path.
+from cpython.bytes cimport PyBytes_AS_STRING, PyBytes_FromStringAndSize, PyBytes_GET_SIZE
+from libc.math cimport isnan, nearbyint
+from libc.stdio cimport snprintf
+from libc.stdlib cimport free, malloc, realloc, strtod
+from libc.string cimport memcmp, memcpy
+
+# Enough for '%.5f' of any finite double (309 integer digits) plus sign.
+cdef enum:
+    NUM_BUF_SIZE = 400
+
+cdef enum RangeMode:
+    UNBOUNDED
+    Z_RANGE
+    LAYER_RANGE
+
+cdef inline bint is_digit(char c) nogil:
+    return c'0' <= c <= c'9'
+
+cdef inline bint is_word(char c) nogil:
+    return is_digit(c) or c'a' <= c <= c'z' or c'A' <= c <= c'Z' or c == c'_'
+
+cdef inline bint is_space(char c) nogil:
+    return c == c' ' or c == c'\t' or c == c'\n' or c == c'\r' or c == 11 or c == 12
+
+cdef Py_ssize_t scan_number(const char *s, Py_ssize_t i, Py_ssize_t n) noexcept nogil:
+    cdef Py_ssize_t j
+    if i < n and (s[i] == c'+' or s[i] == c'-'):
+        i += 1
+    j = i
+    while j < n and is_digit(s[j]):
+        j += 1
+    if j + 1 < n and s[j] == c'.' and is_digit(s[j + 1]):
+        j += 2
+        while j < n and is_digit(s[j]):
+            j += 1
+    return j if j > i else -1
+
+cdef double parse_number(const char *s, Py_ssize_t start, Py_ssize_t end) except? -1.0:
+    cdef char small[64]
+    cdef char *tmp = small
+    cdef Py_ssize_t n = end - start
+    cdef double value
+    if n >= 64:
+        tmp = <char *>malloc(n + 1)
+        if tmp == NULL:
+            raise MemoryError()
+    memcpy(tmp, s + start, n)
+    tmp[n] = 0
+    value = strtod(tmp, NULL)
+    if tmp != small:
+        free(tmp)
+    return value
+
+cdef Py_ssize_t find_z(const char *s, Py_ssize_t start, Py_ssize_t end,
+                       Py_ssize_t *num_end) noexcept nogil:
+    cdef Py_ssize_t i = start, j
+    while i < end:
+        if s[i] == c'Z' and (i == start or not is_word(s[i - 1])):
+            j = scan_number(s, i + 1, end)
+            if j >= 0:
+                num_end[0] = j
+                return i + 1
+        i += 1
+    return -1
+
+cdef Py_ssize_t find_e(const char *s, Py_ssize_t start, Py_ssize_t end,
+                       Py_ssize_t *num_end) noexcept nogil:
+    cdef Py_ssize_t i, j
+    if end - start < 2:
+        return -1
+    if not (s[start] == c'G' or s[start] == c'g'):
+        return -1
+    if not (s[start + 1] == c'0' or s[start + 1] == c'1'):
+        return -1
+    i = start + 3
+    while i < end:
+        if s[i] == c'E' and is_space(s[i - 1]):
+            j = scan_number(s, i + 1, end)
+            if j >= 0:
+                num_end[0] = j
+                return i + 1
+        i += 1
+    return -1
+
+def process_chunk(bytes chunk, double flow_ratio, z_start, z_end,
+                  layer_start, layer_end, layer_height, list state):
+    """Scale the E values of every line in chunk.
+
+    Mirrors the pure-Python path of flow-scale.py, including its Z/layer
+    range handling. state is the same [current Z, in range] list and is
+    updated in place. Returns (output, line count, modified line count);
+    output is chunk itself when no line was modified.
+    """
+    cdef const char *s = PyBytes_AS_STRING(chunk)
+    cdef Py_ssize_t n = PyBytes_GET_SIZE(chunk)
+    cdef Py_ssize_t pos = 0, line_start, line_end, next_start
+    cdef Py_ssize_t num_start, num_end = 0, num_len
+    cdef Py_ssize_t lines = 0, modified = 0
+    cdef Py_ssize_t out_len = 0, out_cap = n + n // 2 + NUM_BUF_SIZE
+    cdef char *out
+    cdef char *grown
+    cdef char num[NUM_BUF_SIZE]
+    # Layer numbers are kept as integral doubles so huge Z values cannot
+    # overflow an integer cast.
+    cdef double z, zs = 0.0, ze = 0.0, lh = 0.0, value
+    cdef double layer, ls = 0.0, le = 0.0
+    cdef bint has_z_end = z_end is not None
+    cdef bint has_layer_end = layer_end is not None
+    cdef bint has_z = state[0] is not None
+    cdef double current_z = state[0] if has_z else 0.0
+    cdef bint in_range = state[1]
+    cdef RangeMode mode = UNBOUNDED
+
+    if layer_start is not None:
+        if layer_height:
+            mode = LAYER_RANGE
+            lh = layer_height
+            ls = layer_start
+            le = layer_end if has_layer_end else 0
+    elif z_start is not None:
+        mode = Z_RANGE
+        zs = z_start
+        ze = z_end if has_z_end else 0.0
+
+    out = <char *>malloc(out_cap)
+    if out == NULL:
+        raise MemoryError()
+    try:
+        while pos < n:
+            line_start = pos
+            line_end = pos
+            while line_end < n and s[line_end] != c'\n' and s[line_end] != c'\r':
+                line_end += 1
+            next_start = line_end
+            if next_start < n:
+                if s[next_start] == c'\r' and next_start + 1 < n and s[next_start + 1] == c'\n':
+                    next_start += 2
+                else:
+                    next_start += 1
+            lines += 1
+            pos = next_start
+
+            if out_len + (next_start - line_start) + NUM_BUF_SIZE > out_cap:
+                out_cap = (out_len + (next_start - line_start) + NUM_BUF_SIZE) * 2
+                grown = <char *>realloc(out, out_cap)
+                if grown == NULL:
+                    raise MemoryError()
+                out = grown
+
+            if mode != UNBOUNDED:
+                num_start = find_z(s, line_start, line_end, &num_end)
+                if num_start >= 0:
+                    z = parse_number(s, num_start, num_end)
+                    if not has_z or z != current_z:
+                        has_z = True
+                        current_z = z
+                        if mode == Z_RANGE:
+                            in_range = zs <= z and (not has_z_end or z <= ze)
+                        else:
+                            layer = nearbyint(z / lh)
+                            in_range = ls <= layer and (not has_layer_end or layer <= le)
+
+            num_start = -1
+            if in_range:
+                num_start = find_e(s, line_start, line_end, &num_end)
+            if num_start < 0:
+                memcpy(out + out_len, s + line_start, next_start - line_start)
+                out_len += next_start - line_start
+                continue
+
+            value = parse_number(s, num_start, num_end) * flow_ratio
+            if isnan(value):
+                # glibc prints the sign of a NaN ("-nan"); Python never does.
+                memcpy(num, b"nan", 3)
+                num_len = 3
+            else:
+                num_len = snprintf(num, NUM_BUF_SIZE, "%.5f", value)
+            if num_len != num_end - num_start or memcmp(num, s + num_start, num_len) != 0:
+                modified += 1
+            memcpy(out + out_len, s + line_start, num_start - line_start)
+            out_len += num_start - line_start
+            memcpy(out + out_len, num, num_len)
+            out_len += num_len
+            memcpy(out + out_len, s + num_end, next_start - num_end)
+            out_len += next_start - num_end
+
+        state[0] = current_z if has_z else None
+        state[1] = in_range
+        if not modified:
+            return chunk, lines, 0
+        return PyBytes_FromStringAndSize(out, out_len), lines, modified
+    finally:
+        free(out)
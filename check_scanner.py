@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# Compare the compiled scanner (_flow_scale) against the pure-Python path of
+# flow-scale.py on random G-code. Both must produce identical bytes, line
+# counts, modified counts and Z/range state for every chunk.
+import argparse
+import importlib.util
+import os
+import random
+import sys
+
+_TOKENS = (
+    'G1', 'G0', 'g1', 'g0', 'G10', 'G92 E0', 'M82', 'M83', ' ', '\t', ';', '.', '0', '1',
+    'E', 'E1.5', 'E-.3', 'E+2', 'E7.', 'E0', 'E1.00000', 'E' + '1' * 80,
+    'Z', 'Z0.2', 'Z0.3', 'Z0.5', 'Z0.7', 'Z1', 'Z-1', 'Z.9', 'XZ2', '_Z4', 'Z' + '9' * 70,
+    'X1', '\n', '\r', '\r\n'
+)
+# (z_start, z_end, layer_start, layer_end, layer_height)
+_RANGES = (
+    (None, None, None, None, None),
+    (0.4, None, None, None, None),
+    (0.4, 0.9, None, None, None),
+    (None, 0.9, None, None, None),
+    (None, None, 2, 3, 0.2),
+    (None, None, 2, None, 0.2),
+    (None, None, 1, 1, 0.2),
+    (None, None, 1, 3, 0),
+    (0.2, None, 2, 4, 0.2)
+)
+_FLOW_RATIOS = (1.1, 0.9, 1.0, 2.5, 0.0, -1.0, float('inf'), float('-inf'), float('nan'))
+
+def load_flow_scale():
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'flow-scale.py')
+    sys.path.insert(0, os.path.dirname(path))
+    spec = importlib.util.spec_from_file_location('flow_scale', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def random_chunk(rng):
+    return ''.join(rng.choice(_TOKENS) for _ in range(rng.randint(0, 25))).encode()
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the compiled scanner against the pure-Python path")
+    parser.add_argument('-n', '--iterations', type=int, default=20000, help='Number of random inputs')
+    parser.add_argument('-s', '--seed', type=int, default=0, help='Random seed')
+    args = parser.parse_args()
+
+    flow_scale = load_flow_scale()
+    if flow_scale._flow_scale is None:
+        print("❌ ERROR: _flow_scale is not built; run `cythonize -i _flow_scale.pyx` first.", file=sys.stderr)
+        sys.exit(1)
+
+    rng = random.Random(args.seed)
+    for _ in range(args.iterations):
+        ranges = rng.choice(_RANGES)
+        flow_ratio = rng.choice(_FLOW_RATIOS)
+        py_state = [None, True]
+        c_state = [None, True]
+        for _ in range(3):
+            chunk = random_chunk(rng)
+            expected = flow_scale.scale_chunk(chunk, flow_ratio, *ranges, py_state)
+            got = flow_scale._flow_scale.process_chunk(chunk, flow_ratio, *ranges, c_state)
+            if got != expected or c_state != py_state:
+                print("❌ ERROR: Compiled scanner differs from the Python path.", file=sys.stderr)
+                print(f"Input: {chunk!r}", file=sys.stderr)
+                print(f"Flow ratio: {flow_ratio}, range: {ranges}", file=sys.stderr)
+                print(f"Python: {expected!r} {py_state}", file=sys.stderr)
+                print(f"Compiled: {got!r} {c_state}", file=sys.stderr)
+                sys.exit(1)
+
+    print(f"✅ {args.iterations} random inputs matched.")
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,96 @@
 #!/usr/bin/env python3
 import re
 import argparse
+import collections
+import concurrent.futures
+import operator
 import sys
 import os
+import mmap
+import shutil
+import tempfile
+
+try:
+    import _flow_scale
+except ImportError:
+    _flow_scale = None
+
+_Z_RE = re.compile(rb'\bZ([-+]?[0-9]*\.?[0-9]+)')
+_G92_RE = re.compile(rb'\bG92\s+E0\b')
+
+_LAYER_ENV_KEYS = (
+    'ORCASLICER_LAYER_HEIGHT',
+    'SUPERSLICER_LAYER_HEIGHT',
+    'SLIC3R_LAYER_HEIGHT',
+    'BAMBU_LAYER_HEIGHT',
+    'LAYER_HEIGHT',
+    'layer_height',
+    'LAYERHEIGHT'
+)
+_PATH_ENV_KEYS = (
+    'ORCASLICER_GCODE_OUTPUT_PATH',
+    'SUPERSLICER_GCODE_OUTPUT_PATH',
+    'SLIC3R_PP_OUTPUT_NAME',
+    'BAMBU_GCODE_PATH'
+)
+
+_IO_BUFFER_SIZE = 1 << 20
+_PARALLEL_MIN_SIZE = 10 << 20
+_PARALLEL_CHUNK_SIZE = 4 << 20
+
+_MOVE_CMDS = (b'G0', b'G1', b'g0', b'g1')
+_DIGITS = b'0123456789'
+_WHITESPACE = b' \t\n\r\x0b\x0c'
+# Single-byte membership tests take an int; `b'Z' in line` goes through the
+# much slower buffer protocol.
+_Z = ord('Z')
+_E = ord('E')
+
+def scan_number(line, i):
+    n = len(line)
+    if i < n and line[i] in b'+-':
+        i += 1
+    # Measure digit runs with lstrip() so the scanning happens in C.
+    j = n - len(line[i:].lstrip(_DIGITS))
+    if j + 1 < n and line[j] in b'.' and line[j + 1] in _DIGITS:
+        j = n - len(line[j + 1:].lstrip(_DIGITS))
+    return j if j > i else -1
 
 def extract_z(line):
-    match = re.search(r'\bZ([-+]?[0-9]*\.?[0-9]+)', line)
+    if _Z not in line:
+        return None
+    match = _Z_RE.search(line)
     return float(match.group(1)) if match else None
 
+def line_bounds(chunk, pos):
+    start = chunk.rfind(b'\n', 0, pos) + 1
+    start = chunk.rfind(b'\r', start, pos) + 1 or start
+    end = chunk.find(b'\n', pos)
+    if end < 0:
+        end = len(chunk)
+    cr = chunk.find(b'\r', pos, end)
+    return start, end if cr < 0 else cr
+
+def scan_extrusion_state(chunk, extrusion_mode, g92_e0_count):
+    starts = set()
+    for token in (b'M8', b'G92'):
+        pos = chunk.find(token)
+        while pos >= 0:
+            starts.add(line_bounds(chunk, pos))
+            pos = chunk.find(token, pos + len(token))
+
+    for start, end in sorted(starts):
+        line = chunk[start:end]
+        if b'M82' in line:
+            extrusion_mode = 'absolute'
+        elif b'M83' in line:
+            extrusion_mode = 'relative'
+        elif _G92_RE.search(line):
+            g92_e0_count += 1
+    return extrusion_mode, g92_e0_count
+
 def get_layer_height_from_env():
-    candidates = [
-        'ORCASLICER_LAYER_HEIGHT',
-        'SUPERSLICER_LAYER_HEIGHT',
-        'SLIC3R_LAYER_HEIGHT',
-        'BAMBU_LAYER_HEIGHT',
-        'LAYER_HEIGHT',
-        'layer_height',
-        'LAYERHEIGHT'
-    ]
-    for var in candidates:
+    for var in _LAYER_ENV_KEYS:
         val = os.environ.get(var)
         if val:
             try:
@@ -28,38 +100,218 @@ def get_layer_height_from_env():
     return None
 
 def get_input_path_from_env():
-    candidates = [
-        'ORCASLICER_GCODE_OUTPUT_PATH',
-        'SUPERSLICER_GCODE_OUTPUT_PATH',
-        'SLIC3R_PP_OUTPUT_NAME',
-        'BAMBU_GCODE_PATH'
-    ]
-    for var in candidates:
+    for var in _PATH_ENV_KEYS:
         val = os.environ.get(var)
         if val and os.path.exists(val):
             return val
     return None
 
-def process_gcode_line(line, flow_ratio, current_z, z_start, z_end,
-                       current_layer, layer_start, layer_end, use_layer_mode):
-    if use_layer_mode and current_layer is not None:
-        if current_layer < layer_start or (layer_end is not None and current_layer > layer_end):
-            return line
-    elif not use_layer_mode and z_start is not None and current_z is not None:
-        if current_z < z_start or (z_end is not None and current_z > z_end):
-            return line
-
-    match = re.search(r'^([Gg]0|[Gg]1)(.*?\s)(E)([-+]?[0-9]*\.?[0-9]+)', line)
-    if match:
-        cmd = match.group(1)
-        middle = match.group(2)
-        e_val = float(match.group(4))
-        new_e_val = e_val * flow_ratio
-        new_line = f"{cmd}{middle}E{new_e_val:.5f}"
-        rest = line[match.end():]
-        return new_line + rest
+def make_range_check(z_start, z_end, layer_start, layer_end, layer_height):
+    # The mode is fixed for the whole file, so pick a check specialised for it
+    # once. None means every Z is in range and Z need not be tracked at all.
+    if layer_start is not None:
+        if not layer_height:
+            return None
+        if layer_end is None:
+            return lambda z: layer_start <= int(round(z / layer_height))
+        if layer_end == layer_start:
+            return lambda z: int(round(z / layer_height)) == layer_start
+        return lambda z: layer_start <= int(round(z / layer_height)) <= layer_end
+    if z_start is None:
+        return None
+    if z_end is None:
+        return lambda z: z_start <= z
+    return lambda z: z_start <= z <= z_end
+
+def make_batch_processor(flow_ratio, z_in_range):
+    def process_batch(batch, state):
+        current_z, in_range = state
+        new_batch = []
+        append = new_batch.append
+        for line in batch:
+            if _Z in line:
+                z = extract_z(line)
+                if z is not None and z != current_z:
+                    current_z = z
+                    in_range = z_in_range(z)
+            if in_range and line[:2] in _MOVE_CMDS:
+                line = scale_e_value(line, flow_ratio)
+            append(line)
+        state[0] = current_z
+        state[1] = in_range
+        return new_batch
+
+    return process_batch
+
+def scale_e_value(line, flow_ratio):
+    if _E not in line:
+        return line
+
+    i = line.find(b'E', 3)
+    while i >= 0:
+        if line[i - 1] in _WHITESPACE:
+            j = scan_number(line, i + 1)
+            if j >= 0:
+                new_e_val = float(line[i + 1:j]) * flow_ratio
+                return b'%b%.5f%b' % (line[:i + 1], new_e_val, line[j:])
+        i = line.find(b'E', i + 1)
     return line
 
+def scale_chunk(chunk, flow_ratio, z_start, z_end,
+                layer_start, layer_end, layer_height, state):
+    batch = chunk.splitlines(True)
+    z_in_range = make_range_check(z_start, z_end, layer_start, layer_end, layer_height)
+    if z_in_range is None:
+        new_batch = [
+            scale_e_value(line, flow_ratio) if line[:2] in _MOVE_CMDS else line
+            for line in batch
+        ]
+    else:
+        new_batch = make_batch_processor(flow_ratio, z_in_range)(batch, state)
+    modified = sum(map(operator.ne, new_batch, batch))
+    if modified:
+        chunk = b''.join(new_batch)
+    return chunk, len(batch), modified
+
+_scale_chunk = _flow_scale.process_chunk if _flow_scale is not None else scale_chunk
+
+def last_z(chunk):
+    pos = len(chunk)
+    while True:
+        pos = chunk.rfind(b'Z', 0, pos)
+        if pos < 0:
+            return None
+        start, end = line_bounds(chunk, pos)
+        z = extract_z(chunk[start:end])
+        if z is not None:
+            return z
+        pos = start
+
+def parallel_workers(fin):
+    if not isinstance(fin, mmap.mmap) or len(fin) < _PARALLEL_MIN_SIZE:
+        return 0
+    if hasattr(os, 'sched_getaffinity'):
+        workers = len(os.sched_getaffinity(0))
+    else:
+        workers = os.cpu_count() or 1
+    return workers if workers > 1 else 0
+
+def plan_parallel(mm, track_z, scan_extrusion):
+    # Split the file on line boundaries and record, for every span, the Z
+    # that is current when it starts, so spans can be rewritten independently.
+    # scan_extrusion(g92_e0_count) says whether the extrusion state is still
+    # needed.
+    spans = []
+    extrusion_mode = 'absolute'
+    g92_e0_count = 0
+    current_z = None
+    start = 0
+    while start < len(mm):
+        end = mm.find(b'\n', start + _PARALLEL_CHUNK_SIZE) + 1 or len(mm)
+        spans.append((start, end, current_z))
+        scan = scan_extrusion(g92_e0_count)
+        # Only copy the span out of the mapping when something reads it.
+        if scan or track_z:
+            chunk = mm[start:end]
+            if scan:
+                extrusion_mode, g92_e0_count = scan_extrusion_state(
+                    chunk, extrusion_mode, g92_e0_count
+                )
+            if track_z:
+                z = last_z(chunk)
+                if z is not None:
+                    current_z = z
+        start = end
+    return spans, extrusion_mode, g92_e0_count
+
+def rewrite_span(infile, span, config):
+    start, end, entry_z = span
+    with open(infile, 'rb') as fin:
+        fin.seek(start)
+        chunk = fin.read(end - start)
+    state = [entry_z, True]
+    z_in_range = make_range_check(*config[1:])
+    if entry_z is not None and z_in_range is not None:
+        state[1] = z_in_range(entry_z)
+    return _scale_chunk(chunk, *config, state)
+
+def rewrite_parallel(infile, spans, config, workers):
+    with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+        inflight = collections.deque()
+        for span in spans:
+            inflight.append(pool.submit(rewrite_span, infile, span, config))
+            if len(inflight) > 2 * workers:
+                yield inflight.popleft().result()
+        while inflight:
+            yield inflight.popleft().result()
+
+def open_input(infile):
+    if infile == '-':
+        return sys.stdin.buffer
+    fin = open(infile, 'rb', buffering=_IO_BUFFER_SIZE)
+    try:
+        mm = mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ)
+    except (ValueError, OSError):
+        # Empty files, pipes and other special files cannot be mapped.
+        return fin
+    fin.close()
+    return mm
+
+def read_chunks(fin):
+    tail = b''
+    while True:
+        data = fin.read(_IO_BUFFER_SIZE)
+        if not data:
+            break
+        if tail:
+            data = tail + data
+        cut = data.rfind(b'\n') + 1
+        tail = data[cut:]
+        if cut:
+            yield data[:cut]
+    if tail:
+        yield tail
+
+def open_output(outfile, inplace):
+    if outfile == '-':
+        return sys.stdout.buffer
+    # Output is written in whole chunks, so files are opened unbuffered and
+    # each chunk goes straight to write(2).
+    if inplace:
+        return tempfile.NamedTemporaryFile(
+            'wb', buffering=0,
+            dir=os.path.dirname(os.path.abspath(outfile)),
+            prefix='.flow_scale-', delete=False
+        )
+    return open(outfile, 'wb', buffering=0)
+
+def write_output(fout, data):
+    view = memoryview(data)
+    while view:
+        view = view[fout.write(view):]
+
+def close_output(fout, outfile, inplace):
+    if fout is sys.stdout.buffer:
+        fout.flush()
+        return
+    fout.close()
+    if inplace:
+        shutil.copymode(outfile, fout.name)
+        os.replace(fout.name, outfile)
+
+def discard_output(fout):
+    fout.close()
+    try:
+        os.unlink(fout.name)
+    except OSError:
+        pass
+
+def abort_extrusion_check():
+    print("❌ ERROR: Detected M82 (absolute extrusion) with fewer than 2 G92 E0 resets.", file=sys.stderr)
+    print("Scaling E values directly may lead to incorrect extrusion.", file=sys.stderr)
+    print("Use --force to override this check if you know what you're doing.", file=sys.stderr)
+    sys.exit(1)
+
 def write_debug_output(params, to_stderr=False, to_file_path=None):
     lines = ["=== flow_scale Debug Info ==="]
     for key, value in params.items():
@@ -113,6 +365,17 @@ def main():
     else:
         outfile = args.outfile
 
+    # Decided before the input is mapped: writing over a mapped file in place
+    # would truncate it under the reader (SIGBUS), so such output always goes
+    # through a temp file that replaces the input once it is complete.
+    inplace = args.inplace or (
+        infile != '-' and outfile != '-' and os.path.exists(outfile)
+        and os.path.samefile(infile, outfile)
+    )
+    if inplace:
+        # Replace the file a symlink points at rather than the link itself.
+        outfile = os.path.realpath(outfile)
+
     use_layer_mode = args.layers is not None
     layer_start = layer_end = None
     if use_layer_mode:
@@ -124,57 +387,85 @@ def main():
             layer_start = int(args.layers)
             layer_end = layer_start
 
-    current_z = None
-    extrusion_mode = 'absolute'
-    g92_e0_count = 0
-    input_lines = []
-
-    input_stream = sys.stdin if infile == '-' else open(infile, 'r')
-    with input_stream as fin:
-        for line in fin:
-            input_lines.append(line)
-            if 'M82' in line:
-                extrusion_mode = 'absolute'
-            elif 'M83' in line:
-                extrusion_mode = 'relative'
-            elif re.search(r'\bG92\s+E0\b', line):
-                g92_e0_count += 1
-
     layer_height = args.layer_height or get_layer_height_from_env()
     if use_layer_mode and layer_height is None:
         print("❌ ERROR: Layer height not provided and could not be found in environment.", file=sys.stderr)
         sys.exit(1)
 
-    if extrusion_mode == 'absolute' and g92_e0_count < 2 and not args.force:
-        print("❌ ERROR: Detected M82 (absolute extrusion) with fewer than 2 G92 E0 resets.", file=sys.stderr)
-        print("Scaling E values directly may lead to incorrect extrusion.", file=sys.stderr)
-        print("Use --force to override this check if you know what you're doing.", file=sys.stderr)
-        sys.exit(1)
+    config = (
+        args.flow_ratio, args.z_start, args.z_end,
+        layer_start, layer_end, layer_height
+    )
+    # [current Z, whether the current Z is inside the requested range]
+    state = [None, True]
 
+    extrusion_mode = 'absolute'
+    g92_e0_count = 0
+    total_lines = 0
     modified_lines = 0
-    output_stream = sys.stdout if outfile == '-' else open(outfile, 'w')
-    with output_stream as fout:
-        for line in input_lines:
-            z = extract_z(line)
-            if z is not None:
-                current_z = z
-
-            current_layer = None
-            if use_layer_mode and current_z is not None and layer_height:
-                current_layer = int(round(current_z / layer_height))
-
-            new_line = process_gcode_line(
-                line, args.flow_ratio,
-                current_z, args.z_start, args.z_end,
-                current_layer, layer_start, layer_end,
-                use_layer_mode
-            )
-            if new_line != line:
-                modified_lines += 1
-            fout.write(new_line)
-
-    if args.debug or args.debug_file:
-        total_lines = len(input_lines)
+
+    input_stream = open_input(infile)
+    workers = parallel_workers(input_stream)
+    debug = args.debug or args.debug_file
+
+    fout = None
+    try:
+        # Without --force, output is held back until the G92 E0 safety check
+        # can be decided: as soon as the second reset is seen, or at end of
+        # input. After that the extrusion state is only tracked for the debug
+        # report.
+        pending = None if args.force else []
+        fout = open_output(outfile, inplace) if pending is None else None
+        with input_stream as fin:
+            if workers:
+                spans, extrusion_mode, g92_e0_count = plan_parallel(
+                    fin, make_range_check(*config[1:]) is not None,
+                    lambda count: debug or (not args.force and count < 2)
+                )
+                if pending is not None:
+                    if extrusion_mode == 'absolute' and g92_e0_count < 2:
+                        abort_extrusion_check()
+                    fout = open_output(outfile, inplace)
+                    pending = None
+                for chunk, lines, modified in rewrite_parallel(infile, spans, config, workers):
+                    total_lines += lines
+                    modified_lines += modified
+                    write_output(fout, chunk)
+            else:
+                for chunk in read_chunks(fin):
+                    if debug or pending is not None:
+                        extrusion_mode, g92_e0_count = scan_extrusion_state(
+                            chunk, extrusion_mode, g92_e0_count
+                        )
+                    chunk, lines, modified = _scale_chunk(chunk, *config, state)
+                    total_lines += lines
+                    modified_lines += modified
+
+                    if pending is None:
+                        write_output(fout, chunk)
+                    else:
+                        pending.append(chunk)
+                        if g92_e0_count >= 2:
+                            fout = open_output(outfile, inplace)
+                            for chunk in pending:
+                                write_output(fout, chunk)
+                            pending = None
+
+        if pending is not None:
+            if extrusion_mode == 'absolute':
+                abort_extrusion_check()
+            fout = open_output(outfile, inplace)
+            for chunk in pending:
+                write_output(fout, chunk)
+            pending = None
+
+        close_output(fout, outfile, inplace)
+    except BaseException:
+        if inplace and fout is not None:
+            discard_output(fout)
+        raise
+
+    if debug:
         percent_modified = (modified_lines / total_lines) * 100 if total_lines > 0 else 0.0
         debug_data = {
             'Input file': infile,